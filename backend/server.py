@@ -1,14 +1,32 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, ReplaceOne, monitoring
+from pymongo.errors import OperationFailure, PyMongoError
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncio
 import os
 import logging
+import logging.handlers
+import atexit
+import fcntl
+import queue
+import random
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Callable, Dict, List, NamedTuple, Optional
+from collections import OrderedDict
+from urllib.parse import parse_qs
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
+import hashlib
+import math
+import multiprocessing
+import threading
+import time
 import pytz
 import json
 
@@ -17,11 +35,211 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+
+def mongo_client_options() -> dict:
+    """Pool sizing and timeouts for the Motor client, read from the environment"""
+    options = {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+        "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        "socketTimeoutMS": int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 10000)),
+        "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+    }
+    # Per-operation deadline covering selection, checkout and the round trip
+    if os.environ.get('MONGO_TIMEOUT_MS'):
+        options["timeoutMS"] = int(os.environ['MONGO_TIMEOUT_MS'])
+    return options
+
+def motor_executor_workers() -> int:
+    """Size of the thread pool Motor runs every PyMongo call on (mirrors motor.frameworks.asyncio)"""
+    if 'MOTOR_MAX_WORKERS' in os.environ:
+        return int(os.environ['MOTOR_MAX_WORKERS'])
+    return multiprocessing.cpu_count() * 5
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener, monitoring.CommandListener):
+    """Connection pool and command metrics collected from PyMongo monitoring events.
+
+    Events are published from the driver's worker threads, so counters are
+    guarded by a lock. Motor also queues calls on its own executor before they
+    ever reach the pool, so handlers wrap their Mongo calls in track() to count
+    calls in flight and their end-to-end latency, queueing included.
+    """
+
+    def __init__(self, max_pool_size: int, executor_workers: int, max_in_flight: int):
+        self.max_pool_size = max_pool_size
+        self.executor_workers = executor_workers
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.operations = 0
+        self.operation_failures = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.in_flight = 0
+        self.calls = 0
+        self.call_latency_total = 0.0
+        self.call_latency_max = 0.0
+
+    @property
+    def saturated(self) -> bool:
+        # Too many handler calls outstanding, or the pool is full with callers queued
+        # behind it. A max of 0 means unbounded; waiting alone is not enough, since
+        # every checkout briefly waits while it starts.
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return True
+        return bool(self.max_pool_size) and self.checked_out >= self.max_pool_size and self.waiting > 0
+
+    @asynccontextmanager
+    async def track(self):
+        """Count a handler's Mongo call as in flight and time it, executor queueing included"""
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.in_flight -= 1
+                self.calls += 1
+                self.call_latency_total += elapsed
+                self.call_latency_max = max(self.call_latency_max, elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                # Calls beyond Motor's worker count wait in its executor, not the pool
+                "executor_queue": max(0, self.in_flight - self.executor_workers),
+                "calls": self.calls,
+                "call_latency_ms": {
+                    "avg": round(self.call_latency_total / self.calls * 1000, 3) if self.calls else 0.0,
+                    "max": round(self.call_latency_max * 1000, 3),
+                },
+                "max_pool_size": self.max_pool_size,
+                "checked_out": self.checked_out,
+                "wait_queue": self.waiting,
+                "saturated": self.saturated,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_time_ms": {
+                    "avg": round(self.wait_time_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                    "max": round(self.wait_time_max * 1000, 3),
+                },
+                "operations": self.operations,
+                "operation_failures": self.operation_failures,
+                "operation_latency_ms": {
+                    "avg": round(self.latency_total / self.operations * 1000, 3) if self.operations else 0.0,
+                    "max": round(self.latency_max * 1000, 3),
+                },
+            }
+
+    # Connection pool events
+    def connection_check_out_started(self, event):
+        self._local.wait_started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event):
+        waited = time.monotonic() - getattr(self._local, "wait_started", time.monotonic())
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    # Command events
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record_operation(event.duration_micros, failed=False)
+
+    def failed(self, event):
+        self._record_operation(event.duration_micros, failed=True)
+
+    def _record_operation(self, duration_micros: int, failed: bool):
+        duration = duration_micros / 1_000_000
+        with self._lock:
+            self.operations += 1
+            self.operation_failures += int(failed)
+            self.latency_total += duration
+            self.latency_max = max(self.latency_max, duration)
+
+mongo_pool_metrics = MongoPoolMetrics(
+    mongo_client_options()["maxPoolSize"],
+    executor_workers=motor_executor_workers(),
+    # Defaults to Motor's worker count: any more calls would only queue in its executor
+    max_in_flight=int(os.environ.get('MONGO_MAX_IN_FLIGHT', motor_executor_workers())),
+)
+
+# Created and closed by the app lifespan
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, saved_timezone_replica
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_pool_metrics], **mongo_client_options())
+    db = client[os.environ['DB_NAME']]
+
+    if os.environ.get('SAVED_TIMEZONES_WRITE_BEHIND', 'false').lower() == 'true':
+        saved_timezone_replica = SavedTimezoneReplica(
+            db.saved_timezones,
+            Path(os.environ.get('SAVED_TIMEZONES_JOURNAL', ROOT_DIR / 'saved_timezones.journal')),
+            flush_interval=float(os.environ.get('SAVED_TIMEZONES_FLUSH_INTERVAL', 1.0)),
+            batch_size=int(os.environ.get('SAVED_TIMEZONES_BATCH_SIZE', 100)),
+            poll_interval=float(os.environ.get('SAVED_TIMEZONES_POLL_INTERVAL', 5.0)),
+        )
+        await saved_timezone_replica.start()
+
+    yield
+
+    if saved_timezone_replica:
+        await saved_timezone_replica.stop()
+        saved_timezone_replica = None
+    client.close()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -194,6 +412,622 @@ def convert_to_ist(source_timezone: str, source_datetime: datetime = None) -> Co
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Timezone conversion error: {str(e)}")
 
+def build_time_of_day_table(ist_date: date) -> dict:
+    """Build the zone x hour offset matrix and day-boundary table for one IST day"""
+    ist_tz = pytz.timezone('Asia/Kolkata')
+    day_start = ist_tz.localize(datetime.combine(ist_date, datetime.min.time()))
+    day_end = day_start + timedelta(days=1)
+    hour_starts = [day_start + timedelta(hours=hour) for hour in range(24)]
+    
+    zones = []
+    offsets = []
+    boundaries = []
+    for tz_id in TIMEZONE_DATA:
+        tz = pytz.timezone(tz_id)
+        zones.append(tz_id)
+        # UTC offset in minutes at the start of each IST hour
+        offsets.append([int(hour_start.astimezone(tz).utcoffset().total_seconds() // 60) for hour_start in hour_starts])
+        
+        local_start = day_start.astimezone(tz)
+        local_end = day_end.astimezone(tz)
+        local_midnight = None
+        if local_end.date() != local_start.date():
+            midnight = tz.localize(datetime.combine(local_end.date(), datetime.min.time())).astimezone(ist_tz)
+            if midnight < day_end:
+                local_midnight = midnight.strftime("%H:%M")
+        
+        boundaries.append({
+            "start": local_start.isoformat(),
+            "end": local_end.isoformat(),
+            "local_midnight_ist": local_midnight
+        })
+    
+    return {
+        "date": ist_date.isoformat(),
+        "ist_offset": "+05:30",
+        "zones": zones,
+        "offsets": offsets,
+        "day_boundaries": boundaries
+    }
+
+# Serialized tables by IST date, with their ETags; each day is only computed once
+TIME_OF_DAY_CACHE_SIZE = 32
+time_of_day_cache: "OrderedDict[date, tuple]" = OrderedDict()
+
+def get_time_of_day_table(ist_date: date) -> tuple:
+    """Get the cached (body, etag) pair for an IST day, building it on first use"""
+    cached = time_of_day_cache.get(ist_date)
+    if cached is not None:
+        time_of_day_cache.move_to_end(ist_date)
+        return cached
+    
+    body = json.dumps(build_time_of_day_table(ist_date), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    time_of_day_cache[ist_date] = (body, etag)
+    if len(time_of_day_cache) > TIME_OF_DAY_CACHE_SIZE:
+        time_of_day_cache.popitem(last=False)
+    return body, etag
+
+# Logging
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+log_sampled_var: ContextVar[bool] = ContextVar("log_sampled", default=True)
+
+class JsonFormatter(logging.Formatter):
+    """Render records as one JSON object per line, including any `extra` fields"""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class LogContextFilter(logging.Filter):
+    """Tag records with the current request ID and drop unsampled INFO/DEBUG records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return record.levelno >= logging.WARNING or log_sampled_var.get()
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The base class formats here, on the event loop; records stay in-process,
+        # so msg/args can be handed over as-is and rendered by the listener
+        return record
+
+def parse_log_sample_rates(value: str) -> Dict[str, float]:
+    """Parse "prefix=rate,prefix=rate" into a mapping of path prefix to sample rate"""
+    rates = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        prefix, _, rate = item.partition("=")
+        try:
+            rate_value = float(rate)
+        except ValueError:
+            rate_value = math.nan
+        if not prefix.strip() or math.isnan(rate_value):
+            # Runs at import, before `logger` exists; a typo must not stop the app starting
+            logging.getLogger(__name__).warning("Ignoring malformed LOG_SAMPLE_RATES entry %r", item)
+            continue
+        rates[prefix.strip()] = min(1.0, max(0.0, rate_value))
+    return rates
+
+def configure_logging() -> logging.handlers.QueueListener:
+    """Send all records through a queue to a background thread that writes JSON lines"""
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(LogContextFilter())
+    
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    
+    # uvicorn installs its own synchronous stream handlers before importing the app;
+    # hand its records (including the per-request access log) to the queue as well
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+class RequestContextMiddleware:
+    """ASGI middleware assigning a request ID and a per-route log sampling decision"""
+
+    def __init__(self, app, sample_rates: Dict[str, float]):
+        self.app = app
+        # Longest prefix wins
+        self.sample_rates = sorted(sample_rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _sample_rate(self, path: str) -> float:
+        for prefix, rate in self.sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        rate = self._sample_rate(scope["path"])
+        request_id_token = request_id_var.set(request_id)
+        sampled_token = log_sampled_var.set(rate >= 1.0 or random.random() < rate)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(request_id_token)
+            log_sampled_var.reset(sampled_token)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110)"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == opaque_tag:
+            return True
+    return False
+
+# Rate limiting
+class RateLimitRule(NamedTuple):
+    name: str
+    prefix: str
+    capacity: float
+    refill_rate: float  # tokens per second
+    cost: Optional[Callable[[dict], float]] = None
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int  # seconds until the bucket is full again
+    retry_after: int = 0
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+def timezone_times_cost(scope: dict) -> float:
+    """Charge batch lookups one token per requested timezone"""
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    ids = query.get("timezone_ids", [""])[0]
+    return float(max(1, len([tz_id for tz_id in ids.split(",") if tz_id])))
+
+# Sized above the frontend's own traffic: it polls /api/ist-time every second per tab
+RATE_LIMIT_RULES = [
+    RateLimitRule("timezone-times", "/api/timezone-times", 120, 2.0, timezone_times_cost),
+    RateLimitRule("convert", "/api/convert", 60, 1.0),
+    RateLimitRule("ist-time", "/api/ist-time", 60, 3.0),
+    RateLimitRule("saved-timezones", "/api/saved-timezones", 30, 0.5),
+    RateLimitRule("default", "/api", 120, 2.0),
+]
+
+# Overall per-client quota, checked in addition to the per-route bucket
+RATE_LIMIT_CLIENT_RULE = RateLimitRule(
+    "client",
+    "/api",
+    float(os.environ.get('RATE_LIMIT_CLIENT_CAPACITY', 300)),
+    float(os.environ.get('RATE_LIMIT_CLIENT_REFILL', 5.0)),
+)
+
+class RateLimiter:
+    """In-memory token buckets keyed by (client, rule), evicted least recently used first"""
+
+    def __init__(self, rules: List[RateLimitRule], client_rule: RateLimitRule, max_entries: int = 10000):
+        self.rules = rules
+        self.client_rule = client_rule
+        self.max_entries = max_entries
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+
+    def match(self, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        return None
+
+    def _bucket(self, client: str, rule: RateLimitRule, now: float) -> TokenBucket:
+        key = (client, rule.name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rule.capacity, now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_entries:
+                # An evicted client simply starts again with a full bucket
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            elapsed = now - bucket.updated
+            if elapsed > 0:
+                bucket.tokens = min(rule.capacity, bucket.tokens + elapsed * rule.refill_rate)
+                bucket.updated = now
+        return bucket
+
+    def acquire(self, client: str, path: str, scope: dict) -> Optional[RateLimitDecision]:
+        rule = self.match(path)
+        if rule is None:
+            return None
+
+        now = time.monotonic()
+        cost = rule.cost(scope) if rule.cost else 1.0
+        checks = []
+        for bucket_rule in (rule, self.client_rule):
+            bucket = self._bucket(client, bucket_rule, now)
+            checks.append((bucket_rule, bucket, min(cost, bucket_rule.capacity)))
+
+        denied = [(r, b, c) for r, b, c in checks if b.tokens < c]
+        if denied:
+            retry_after = max(math.ceil((c - b.tokens) / r.refill_rate) for r, b, c in denied)
+            r, b, _ = denied[0]
+            return RateLimitDecision(
+                allowed=False,
+                limit=int(r.capacity),
+                remaining=int(b.tokens),
+                reset=math.ceil((r.capacity - b.tokens) / r.refill_rate),
+                retry_after=retry_after,
+            )
+
+        for _, bucket, bucket_cost in checks:
+            bucket.tokens -= bucket_cost
+
+        # Report whichever bucket is closest to running out
+        r, b, _ = min(checks, key=lambda check: check[1].tokens / check[0].capacity)
+        return RateLimitDecision(
+            allowed=True,
+            limit=int(r.capacity),
+            remaining=int(b.tokens),
+            reset=math.ceil((r.capacity - b.tokens) / r.refill_rate),
+        )
+
+class RateLimitMiddleware:
+    """ASGI middleware applying RateLimiter and adding RateLimit-* response headers"""
+
+    def __init__(self, app, limiter: RateLimiter, trusted_hops: int = 0):
+        self.app = app
+        self.limiter = limiter
+        # Number of proxies in front of the app that append to X-Forwarded-For
+        self.trusted_hops = trusted_hops
+
+    def _client_id(self, scope: dict) -> str:
+        if self.trusted_hops:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    # Entries left of our own proxies are client-controlled, so count from the right
+                    entries = [entry.strip() for entry in value.decode("latin-1").split(",")]
+                    if len(entries) >= self.trusted_hops and entries[-self.trusted_hops]:
+                        return entries[-self.trusted_hops]
+                    break
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            decision = self.limiter.acquire(self._client_id(scope), scope["path"], scope)
+        except Exception:
+            # Never let the limiter take the API down with it
+            logger.exception("Rate limiter failed, allowing request")
+            decision = None
+
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            "RateLimit-Limit": str(decision.limit),
+            "RateLimit-Remaining": str(decision.remaining),
+            "RateLimit-Reset": str(decision.reset),
+        }
+
+        if not decision.allowed:
+            headers["Retry-After"] = str(decision.retry_after)
+            response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429, headers=headers)
+            await response(scope, receive, send)
+            return
+
+        raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + raw_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+# Saved timezone replica (write-behind mode)
+class SavedTimezoneReplica:
+    """In-memory copy of saved_timezones kept fresh from Mongo, with journaled write-behind.
+
+    Writes are appended to a local fsync'd journal and applied to the in-memory
+    view before they are acknowledged, then flushed to Mongo in ordered batches.
+    Pending writes are always replayed on top of the Mongo state, so a caller
+    reads its own writes even before they reach the database. Flushed batches stay
+    overlaid too until the change stream (or a fresh snapshot) shows them, so a
+    late event from an earlier batch cannot resurrect a newer write. Overlaid ops
+    the stream never confirms, e.g. a no-op replace, expire after confirm_timeout.
+
+    The journal and the in-memory view belong to a single process, so write-behind
+    mode only supports one worker. start() takes an exclusive lock on the journal
+    and fails if another process already holds it.
+    """
+
+    def __init__(self, collection, journal_path: Path, flush_interval: float = 1.0,
+                 batch_size: int = 100, poll_interval: float = 5.0, confirm_timeout: float = 30.0):
+        self.collection = collection
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.confirm_timeout = confirm_timeout
+        self._docs: Dict[str, dict] = {}  # timezone_id -> document as stored in Mongo
+        self._ids: Dict[object, str] = {}  # Mongo _id -> timezone_id, for change stream deletes
+        self._pending: List[dict] = []
+        self._unconfirmed: List[tuple] = []  # (op, flushed_at), flushed but not yet seen on the stream
+        self._flushed = 0
+        self._journal_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._lock_file = None
+
+    async def start(self):
+        self._acquire_journal_lock()
+        self._pending = await asyncio.to_thread(self._read_journal)
+        await self._load_snapshot()
+        self._tasks = [
+            asyncio.create_task(self._sync_loop()),
+            asyncio.create_task(self._flush_loop()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await self.flush()
+        except PyMongoError:
+            logger.warning("Could not flush %d saved timezone writes on shutdown; kept in journal", len(self._pending))
+        self._release_journal_lock()
+
+    def list(self) -> List[dict]:
+        return list(self._view().values())
+
+    def exists(self, timezone_id: str) -> bool:
+        return timezone_id in self._view()
+
+    async def insert(self, doc: dict) -> bool:
+        async with self._journal_lock:
+            if self.exists(doc["timezone_id"]):
+                return False
+            await self._journal({"op": "insert", "doc": doc})
+        return True
+
+    async def delete(self, timezone_id: str) -> bool:
+        async with self._journal_lock:
+            if not self.exists(timezone_id):
+                return False
+            await self._journal({"op": "delete", "timezone_id": timezone_id})
+        return True
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                await self.collection.bulk_write([self._to_request(op) for op in batch], ordered=True)
+                flushed_at = time.monotonic()
+                for op in batch:
+                    self._apply(self._docs, op)
+                    self._unconfirmed.append((op, flushed_at))
+                del self._pending[:len(batch)]
+                self._flushed += 1
+                async with self._journal_lock:
+                    await asyncio.to_thread(self._write_journal, list(self._pending))
+
+    # Internals
+    def _view(self) -> Dict[str, dict]:
+        expired = time.monotonic() - self.confirm_timeout
+        while self._unconfirmed and self._unconfirmed[0][1] < expired:
+            self._unconfirmed.pop(0)
+        if not self._pending and not self._unconfirmed:
+            return self._docs
+        view = dict(self._docs)
+        for op, _ in self._unconfirmed:
+            self._apply(view, op)
+        for op in self._pending:
+            self._apply(view, op)
+        return view
+
+    def _confirm(self, matches: Callable[[dict], bool]):
+        # The stream delivers events in commit order, so once one of our ops shows
+        # up, everything flushed before it has already been seen as well
+        for index, (op, _) in enumerate(self._unconfirmed):
+            if matches(op):
+                del self._unconfirmed[:index + 1]
+                return
+
+    @staticmethod
+    def _apply(docs: Dict[str, dict], op: dict):
+        if op["op"] == "insert":
+            docs[op["doc"]["timezone_id"]] = op["doc"]
+        else:
+            docs.pop(op["timezone_id"], None)
+
+    @staticmethod
+    def _to_request(op: dict):
+        # Upserting by our own id keeps journal replay after a crash idempotent
+        if op["op"] == "insert":
+            return ReplaceOne({"id": op["doc"]["id"]}, op["doc"], upsert=True)
+        return DeleteOne({"timezone_id": op["timezone_id"]})
+
+    def _acquire_journal_lock(self):
+        # Locked through a side file, since the journal itself is swapped by os.replace
+        lock_file = open(self.journal_path.with_name(self.journal_path.name + ".lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Saved timezone journal {self.journal_path} is in use by another process; "
+                "write-behind mode supports a single worker only"
+            )
+        self._lock_file = lock_file
+
+    def _release_journal_lock(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _journal(self, op: dict):
+        await asyncio.to_thread(self._append_journal, op)
+        self._pending.append(op)
+
+    def _append_journal(self, op: dict):
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(op, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_journal(self, ops: List[dict]):
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            for op in ops:
+                f.write(json.dumps(op, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _read_journal(self) -> List[dict]:
+        if not self.journal_path.exists():
+            return []
+        ops = []
+        with open(self.journal_path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # A torn final line means the write was never acknowledged
+                    logger.warning("Skipping unreadable saved timezone journal entry")
+                    continue
+                if op["op"] == "insert":
+                    op["doc"] = SavedTimezone(**op["doc"]).dict()
+                ops.append(op)
+        return ops
+
+    def _set_doc(self, doc: dict):
+        self._docs[doc["timezone_id"]] = doc
+        self._ids[doc["_id"]] = doc["timezone_id"]
+
+    async def _load_snapshot(self):
+        flushed = self._flushed
+        docs = await self.collection.find().to_list(None)
+        if flushed != self._flushed:
+            # A flush landed mid-read; the snapshot may predate it, so keep the current state
+            return
+        # Everything flushed so far is reflected in this snapshot
+        self._unconfirmed = []
+        self._docs = {}
+        self._ids = {}
+        for doc in docs:
+            self._set_doc(doc)
+
+    async def _sync_loop(self):
+        try:
+            await self._watch()
+        except OperationFailure:
+            # Change streams need a replica set; fall back to polling a standalone server
+            logger.info("Change streams unavailable, polling saved timezones every %ss", self.poll_interval)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._load_snapshot()
+            except PyMongoError:
+                logger.warning("Saved timezone poll failed", exc_info=True)
+
+    async def _watch(self):
+        while True:
+            try:
+                async with self.collection.watch(full_document="updateLookup") as stream:
+                    await self._load_snapshot()
+                    async for change in stream:
+                        self._apply_change(change)
+            except OperationFailure:
+                raise
+            except PyMongoError:
+                logger.warning("Saved timezone change stream interrupted, reconnecting", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    def _apply_change(self, change: dict):
+        operation = change["operationType"]
+        if operation in ("insert", "replace", "update") and change.get("fullDocument"):
+            doc = change["fullDocument"]
+            self._set_doc(doc)
+            self._confirm(lambda op: op["op"] == "insert" and op["doc"]["id"] == doc.get("id"))
+        elif operation == "delete":
+            timezone_id = self._ids.pop(change["documentKey"]["_id"], None)
+            if timezone_id is not None:
+                self._docs.pop(timezone_id, None)
+                self._confirm(lambda op: op["op"] == "delete" and op["timezone_id"] == timezone_id)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except PyMongoError:
+                logger.warning("Saved timezone flush failed, %d writes pending", len(self._pending), exc_info=True)
+
+# Started by the app lifespan when SAVED_TIMEZONES_WRITE_BEHIND is enabled; single worker only
+saved_timezone_replica: Optional[SavedTimezoneReplica] = None
+
+# Last successful direct read, served when Mongo is degraded
+saved_timezones_cache: Optional[List[dict]] = None
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -245,7 +1079,28 @@ async def get_ist_time():
 @api_router.get("/saved-timezones", response_model=List[SavedTimezoneResponse])
 async def get_saved_timezones():
     """Get all saved timezones"""
-    saved_timezones = await db.saved_timezones.find().to_list(100)
+    global saved_timezones_cache
+    if saved_timezone_replica:
+        saved_timezones = saved_timezone_replica.list()[:100]
+    else:
+        # "cache" serves the last good read when the pool is saturated or Mongo errors,
+        # "fail" returns 503 straight away instead of queueing behind other handlers
+        degraded_mode = os.environ.get('MONGO_DEGRADED_MODE', 'cache').lower()
+        if degraded_mode != "off" and mongo_pool_metrics.saturated:
+            if degraded_mode == "cache" and saved_timezones_cache is not None:
+                saved_timezones = saved_timezones_cache
+            else:
+                raise HTTPException(status_code=503, detail="Database busy, try again shortly")
+        else:
+            try:
+                async with mongo_pool_metrics.track():
+                    saved_timezones = await db.saved_timezones.find().to_list(100)
+                saved_timezones_cache = saved_timezones
+            except PyMongoError:
+                if degraded_mode != "cache" or saved_timezones_cache is None:
+                    raise HTTPException(status_code=503, detail="Database unavailable")
+                logger.warning("Serving cached saved timezones after Mongo error", exc_info=True)
+                saved_timezones = saved_timezones_cache
     
     result = []
     for saved_tz in saved_timezones:
@@ -269,18 +1124,24 @@ async def add_saved_timezone(request: SavedTimezoneCreate):
     if request.timezone_id not in TIMEZONE_DATA:
         raise HTTPException(status_code=404, detail="Timezone not found")
     
-    # Check if already saved
-    existing = await db.saved_timezones.find_one({"timezone_id": request.timezone_id})
-    if existing:
-        raise HTTPException(status_code=409, detail="Timezone already saved")
-    
     # Create new saved timezone
     saved_tz = SavedTimezone(
         timezone_id=request.timezone_id,
         name=request.name
     )
     
-    await db.saved_timezones.insert_one(saved_tz.dict())
+    if saved_timezone_replica:
+        if not await saved_timezone_replica.insert(saved_tz.dict()):
+            raise HTTPException(status_code=409, detail="Timezone already saved")
+    else:
+        # Check if already saved
+        async with mongo_pool_metrics.track():
+            existing = await db.saved_timezones.find_one({"timezone_id": request.timezone_id})
+        if existing:
+            raise HTTPException(status_code=409, detail="Timezone already saved")
+        
+        async with mongo_pool_metrics.track():
+            await db.saved_timezones.insert_one(saved_tz.dict())
     
     # Return response
     tz_info = TIMEZONE_DATA[request.timezone_id]
@@ -297,16 +1158,32 @@ async def add_saved_timezone(request: SavedTimezoneCreate):
 @api_router.delete("/saved-timezones/{timezone_id:path}")
 async def remove_saved_timezone(timezone_id: str):
     """Remove a timezone from saved list"""
-    logger.info(f"DELETE request for timezone_id: '{timezone_id}' (type: {type(timezone_id)})")
-    
-    result = await db.saved_timezones.delete_one({"timezone_id": timezone_id})
-    logger.info(f"Delete result: deleted_count = {result.deleted_count}")
+    if saved_timezone_replica:
+        deleted_count = int(await saved_timezone_replica.delete(timezone_id))
+    else:
+        async with mongo_pool_metrics.track():
+            result = await db.saved_timezones.delete_one({"timezone_id": timezone_id})
+        deleted_count = result.deleted_count
+    logger.info("Saved timezone delete", extra={"timezone_id": timezone_id, "deleted_count": deleted_count})
     
-    if result.deleted_count == 0:
+    if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Saved timezone not found")
     
     return {"message": "Timezone removed from saved list"}
 
+@api_router.get("/health/db")
+async def get_db_health():
+    """Get MongoDB reachability and connection pool metrics"""
+    pool = mongo_pool_metrics.snapshot()
+    try:
+        async with mongo_pool_metrics.track():
+            await asyncio.wait_for(client.admin.command("ping"), timeout=2)
+        status = "degraded" if pool["saturated"] else "ok"
+    except (PyMongoError, asyncio.TimeoutError):
+        status = "unavailable"
+    
+    return {"status": status, "pool": pool}
+
 @api_router.get("/timezone-times")
 async def get_timezone_times(timezone_ids: str):
     """Get current time for multiple timezones"""
@@ -331,24 +1208,64 @@ async def get_timezone_times(timezone_ids: str):
     
     return results
 
+@api_router.get("/time-of-day-table")
+async def get_time_of_day_table_for_date(request: Request, date: Optional[str] = None):
+    """Get every catalog timezone's UTC offset for each hour of an IST day, plus day boundaries"""
+    if date:
+        try:
+            ist_date = datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+        max_age = 86400
+    else:
+        # The dateless URL means "today", so it may only be cached until IST midnight
+        now = datetime.now(pytz.timezone('Asia/Kolkata'))
+        ist_date = now.date()
+        max_age = max(1, 86400 - (now.hour * 3600 + now.minute * 60 + now.second))
+    
+    try:
+        body, etag = get_time_of_day_table(ist_date)
+    except OverflowError:
+        raise HTTPException(status_code=400, detail="Date out of supported range")
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Off by default: behind an ingress every user shares the proxy's address, so set
+# RATE_LIMIT_TRUSTED_HOPS to the number of proxies in front of the app before enabling
+if os.environ.get('RATE_LIMIT_ENABLED', 'false').lower() == 'true':
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=RateLimiter(
+            RATE_LIMIT_RULES,
+            RATE_LIMIT_CLIENT_RULE,
+            max_entries=int(os.environ.get('RATE_LIMIT_MAX_ENTRIES', 10000)),
+        ),
+        trusted_hops=int(os.environ.get('RATE_LIMIT_TRUSTED_HOPS', 0)),
+    )
+
+# Wraps the rate limiter so its log records carry the request ID too
+app.add_middleware(
+    RequestContextMiddleware,
+    sample_rates=parse_log_sample_rates(os.environ.get('LOG_SAMPLE_RATES', '')),
+)
+
+# Added last so CORS headers are also present on 429 responses
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After"],
 )
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+log_listener = configure_logging()
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -0,0 +1,151 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server import (
+    DeferredQueueHandler,
+    JsonFormatter,
+    LogContextFilter,
+    RequestContextMiddleware,
+    configure_logging,
+    parse_log_sample_rates,
+)
+
+
+def test_parse_log_sample_rates():
+    assert parse_log_sample_rates("/api/ist-time=0.01, /api=0.5") == {"/api/ist-time": 0.01, "/api": 0.5}
+    assert parse_log_sample_rates("/api=2,/docs=-1") == {"/api": 1.0, "/docs": 0.0}
+    assert parse_log_sample_rates("") == {}
+
+
+def test_malformed_log_sample_rates_are_skipped(caplog):
+    with caplog.at_level(logging.WARNING):
+        rates = parse_log_sample_rates("/api=half,/api/ist-time=0.1,=0.5,/docs,/x=nan")
+    assert rates == {"/api/ist-time": 0.1}
+    assert len([record for record in caplog.records if "LOG_SAMPLE_RATES" in record.getMessage()]) == 4
+
+
+def make_pipeline(name):
+    """Logger -> DeferredQueueHandler -> QueueListener -> capture handler, like configure_logging()"""
+    records = []
+
+    class CaptureHandler(logging.Handler):
+        def emit(self, record):
+            records.append(self.format(record))
+
+    capture = CaptureHandler()
+    capture.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(LogContextFilter())
+
+    logger = logging.getLogger(name)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    listener = logging.handlers.QueueListener(log_queue, capture)
+    listener.start()
+    return logger, listener, records
+
+
+def parse(records):
+    return [json.loads(record) for record in records]
+
+
+def test_json_formatter_includes_extra_and_exc_info():
+    record = logging.LogRecord("tests", logging.ERROR, __file__, 1, "failed %s", ("lookup",), None)
+    record.timezone_id = "Asia/Tokyo"
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record.exc_info = sys.exc_info()
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "tests"
+    assert entry["message"] == "failed lookup"
+    assert entry["timezone_id"] == "Asia/Tokyo"
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_queue_handler_defers_formatting_to_listener():
+    logger, listener, records = make_pipeline("tests.queue")
+    formatted = []
+
+    class Lazy:
+        def __str__(self):
+            formatted.append(threading.current_thread().name)
+            return "lazy"
+
+    logger.info("value is %s", Lazy(), extra={"deleted_count": 1})
+    listener.stop()
+
+    [entry] = parse(records)
+    assert entry["message"] == "value is lazy"
+    assert entry["deleted_count"] == 1
+    assert entry["request_id"] is None
+    assert formatted and formatted[0] != threading.current_thread().name
+
+
+def make_app(logger, sample_rates=None):
+    app = FastAPI()
+
+    @app.get("/api/ist-time")
+    async def ist_time():
+        logger.info("info line")
+        logger.warning("warning line")
+        return {}
+
+    app.add_middleware(RequestContextMiddleware, sample_rates=sample_rates or {})
+    return TestClient(app)
+
+
+def test_request_id_is_echoed_and_attached_to_records():
+    logger, listener, records = make_pipeline("tests.request_id")
+    client = make_app(logger)
+
+    response = client.get("/api/ist-time", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["X-Request-ID"] == "abc-123"
+
+    response = client.get("/api/ist-time")
+    generated = response.headers["X-Request-ID"]
+    assert len(generated) == 32
+    listener.stop()
+
+    assert [entry["request_id"] for entry in parse(records)] == ["abc-123", "abc-123", generated, generated]
+
+
+def test_sampling_drops_info_but_keeps_warning():
+    logger, listener, records = make_pipeline("tests.sampling")
+    client = make_app(logger, sample_rates={"/api/ist-time": 0.0})
+    client.get("/api/ist-time")
+    listener.stop()
+
+    assert [entry["message"] for entry in parse(records)] == ["warning line"]
+
+
+def test_uvicorn_loggers_propagate_to_the_queue():
+    access = logging.getLogger("uvicorn.access")
+    access.handlers = [logging.StreamHandler()]
+    access.propagate = False
+    root = logging.getLogger()
+    root_handlers, root_level = root.handlers, root.level
+
+    listener = configure_logging()
+    try:
+        assert access.handlers == []
+        assert access.propagate
+        assert isinstance(root.handlers[0], DeferredQueueHandler)
+    finally:
+        atexit.unregister(listener.stop)
+        listener.stop()
+        root.handlers = root_handlers
+        root.setLevel(root_level)
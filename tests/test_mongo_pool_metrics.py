@@ -0,0 +1,75 @@
+import asyncio
+
+from server import MongoPoolMetrics
+
+
+def make_metrics(max_pool_size, executor_workers=5, max_in_flight=0):
+    return MongoPoolMetrics(max_pool_size, executor_workers=executor_workers, max_in_flight=max_in_flight)
+
+
+def check_out(metrics, count):
+    for _ in range(count):
+        metrics.connection_check_out_started(None)
+        metrics.connection_checked_out(None)
+
+
+def test_full_pool_without_waiters_is_not_saturated():
+    metrics = make_metrics(2)
+    check_out(metrics, 2)
+    assert not metrics.saturated
+
+
+def test_full_pool_with_waiters_is_saturated():
+    metrics = make_metrics(2)
+    check_out(metrics, 2)
+    metrics.connection_check_out_started(None)
+    assert metrics.saturated
+
+    metrics.connection_checked_in(None)
+    metrics.connection_checked_out(None)
+    assert not metrics.saturated
+
+
+def test_unbounded_pool_is_never_saturated():
+    metrics = make_metrics(0)
+    check_out(metrics, 5)
+    metrics.connection_check_out_started(None)
+    assert not metrics.saturated
+
+
+def test_snapshot_reports_checkouts_and_latency():
+    metrics = make_metrics(10)
+    check_out(metrics, 1)
+    metrics._record_operation(2000, failed=False)
+    metrics._record_operation(4000, failed=True)
+    snapshot = metrics.snapshot()
+    assert snapshot["checked_out"] == 1
+    assert snapshot["checkouts"] == 1
+    assert snapshot["operations"] == 2
+    assert snapshot["operation_failures"] == 1
+    assert snapshot["operation_latency_ms"] == {"avg": 3.0, "max": 4.0}
+
+
+def test_calls_in_flight_saturate_before_the_pool_does():
+    metrics = make_metrics(100, executor_workers=2, max_in_flight=3)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def call():
+            async with metrics.track():
+                await release.wait()
+
+        calls = [asyncio.create_task(call()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert metrics.saturated
+        snapshot = metrics.snapshot()
+        assert snapshot["in_flight"] == 3
+        assert snapshot["executor_queue"] == 1
+
+        release.set()
+        await asyncio.gather(*calls)
+        assert not metrics.saturated
+        assert metrics.snapshot()["calls"] == 3
+
+    asyncio.run(run())
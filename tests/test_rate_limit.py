@@ -0,0 +1,107 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import server
+from server import RATE_LIMIT_CLIENT_RULE, RATE_LIMIT_RULES, RateLimiter, RateLimitMiddleware, RateLimitRule
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(monkeypatch, rules=None, max_entries=10000):
+    clock = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return RateLimiter(rules or RATE_LIMIT_RULES, RATE_LIMIT_CLIENT_RULE, max_entries=max_entries), clock
+
+
+def make_client(limiter, trusted_hops=0):
+    app = FastAPI()
+
+    @app.get("/api/ist-time")
+    async def ist_time():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, trusted_hops=trusted_hops)
+    return TestClient(app)
+
+
+def test_one_hertz_poller_is_never_denied(monkeypatch):
+    limiter, clock = make_limiter(monkeypatch)
+    for _ in range(3600):
+        decision = limiter.acquire("10.0.0.1", "/api/ist-time", {})
+        assert decision.allowed
+        clock.now += 1.0
+
+
+def test_burst_is_denied_with_retry_after(monkeypatch):
+    rules = [RateLimitRule("ist-time", "/api/ist-time", 2, 1.0)]
+    limiter, _ = make_limiter(monkeypatch, rules)
+    assert limiter.acquire("c", "/api/ist-time", {}).allowed
+    assert limiter.acquire("c", "/api/ist-time", {}).allowed
+    decision = limiter.acquire("c", "/api/ist-time", {})
+    assert not decision.allowed
+    assert decision.retry_after == 1
+
+
+def test_batch_cost_is_weighted_by_zone_count(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch)
+    scope = {"query_string": b"timezone_ids=Asia/Tokyo,Europe/London,America/Lima"}
+    decision = limiter.acquire("c", "/api/timezone-times", scope)
+    assert decision.remaining == 117
+
+
+def test_unmatched_path_is_not_limited(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch)
+    assert limiter.acquire("c", "/docs", {}) is None
+
+
+def test_buckets_are_evicted_least_recently_used(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch, max_entries=4)
+    for client in ("a", "b", "c"):
+        limiter.acquire(client, "/api/ist-time", {})
+    assert len(limiter._buckets) == 4
+    assert ("a", "ist-time") not in limiter._buckets
+
+
+def test_response_headers_and_429(monkeypatch):
+    rules = [RateLimitRule("ist-time", "/api/ist-time", 1, 0.5)]
+    limiter, _ = make_limiter(monkeypatch, rules)
+    client = make_client(limiter)
+
+    response = client.get("/api/ist-time")
+    assert response.status_code == 200
+    assert response.headers["RateLimit-Limit"] == "1"
+    assert response.headers["RateLimit-Remaining"] == "0"
+
+    response = client.get("/api/ist-time")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+
+
+def test_forwarded_for_uses_trusted_hop_from_the_right(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch)
+    middleware = RateLimitMiddleware(None, limiter, trusted_hops=1)
+    scope = {"headers": [(b"x-forwarded-for", b"1.1.1.1, 203.0.113.7")], "client": ("10.0.0.2", 1234)}
+    assert middleware._client_id(scope) == "203.0.113.7"
+
+    middleware = RateLimitMiddleware(None, limiter, trusted_hops=2)
+    assert middleware._client_id(scope) == "1.1.1.1"
+
+
+def test_forwarded_for_ignored_without_trusted_hops(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch)
+    middleware = RateLimitMiddleware(None, limiter)
+    scope = {"headers": [(b"x-forwarded-for", b"1.1.1.1")], "client": ("10.0.0.2", 1234)}
+    assert middleware._client_id(scope) == "10.0.0.2"
+
+
+def test_short_forwarded_for_falls_back_to_peer(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch)
+    middleware = RateLimitMiddleware(None, limiter, trusted_hops=2)
+    scope = {"headers": [(b"x-forwarded-for", b"1.1.1.1")], "client": ("10.0.0.2", 1234)}
+    assert middleware._client_id(scope) == "10.0.0.2"
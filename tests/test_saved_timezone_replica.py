@@ -0,0 +1,272 @@
+import asyncio
+import json
+
+import pytest
+from pymongo import ReplaceOne
+from pymongo.errors import OperationFailure
+
+from server import SavedTimezone, SavedTimezoneReplica
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return [dict(doc) for doc in self.docs]
+
+
+class FakeCollection:
+    """Enough of a Motor collection for SavedTimezoneReplica, without change streams"""
+
+    def __init__(self, docs=None):
+        self.docs = [dict(doc) for doc in docs or []]
+        self.next_id = len(self.docs)
+        self.bulk_writes = 0
+        self.flush_gate = None
+
+    def find(self):
+        return FakeCursor(self.docs)
+
+    async def bulk_write(self, requests, ordered=True):
+        if self.flush_gate is not None:
+            await self.flush_gate.wait()
+        self.bulk_writes += 1
+        for request in requests:
+            if isinstance(request, ReplaceOne):
+                existing = [doc for doc in self.docs if doc["id"] == request._filter["id"]]
+                if existing:
+                    existing[0].update(request._doc)
+                else:
+                    self.next_id += 1
+                    self.docs.append(dict(request._doc, _id=self.next_id))
+            else:
+                self.docs = [doc for doc in self.docs if doc["timezone_id"] != request._filter["timezone_id"]]
+
+    def watch(self, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+
+class FakeChangeStream:
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class FakeReplicaSetCollection(FakeCollection):
+    """FakeCollection whose writes produce change events, delivered only when the test says so"""
+
+    def __init__(self, docs=None):
+        super().__init__(docs)
+        self.events = []
+        self.stream = asyncio.Queue()
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            before = {doc["timezone_id"]: doc for doc in self.docs}
+            await super().bulk_write([request], ordered)
+            after = {doc["timezone_id"]: doc for doc in self.docs}
+            for timezone_id, doc in after.items():
+                if timezone_id not in before:
+                    self.events.append({"operationType": "insert", "fullDocument": dict(doc)})
+            for timezone_id, doc in before.items():
+                if timezone_id not in after:
+                    self.events.append({"operationType": "delete", "documentKey": {"_id": doc["_id"]}})
+
+    def watch(self, **kwargs):
+        return FakeChangeStream(self.stream)
+
+    async def deliver(self):
+        for event in self.events:
+            self.stream.put_nowait(event)
+        self.events = []
+        await asyncio.sleep(0.01)
+
+
+def saved(timezone_id, id):
+    return SavedTimezone(id=id, timezone_id=timezone_id, name=timezone_id).dict()
+
+
+def write_journal(path, ops):
+    path.write_text("".join(json.dumps(op, default=str) + "\n" for op in ops))
+
+
+def make_replica(collection, tmp_path, **kwargs):
+    kwargs.setdefault("flush_interval", 3600)
+    kwargs.setdefault("poll_interval", 3600)
+    return SavedTimezoneReplica(collection, tmp_path / "saved_timezones.journal", **kwargs)
+
+
+def test_journal_replayed_after_crash(tmp_path):
+    async def run():
+        collection = FakeCollection()
+        write_journal(tmp_path / "saved_timezones.journal", [
+            {"op": "insert", "doc": saved("Asia/Tokyo", "1")},
+            {"op": "insert", "doc": saved("Europe/London", "2")},
+            {"op": "delete", "timezone_id": "Asia/Tokyo"},
+        ])
+        replica = make_replica(collection, tmp_path)
+        await replica.start()
+        assert [doc["timezone_id"] for doc in replica.list()] == ["Europe/London"]
+
+        await replica.stop()
+        assert [doc["timezone_id"] for doc in collection.docs] == ["Europe/London"]
+        assert (tmp_path / "saved_timezones.journal").read_text() == ""
+
+    asyncio.run(run())
+
+
+def test_replay_of_already_flushed_batch_is_idempotent(tmp_path):
+    async def run():
+        # Crashed after bulk_write succeeded but before the journal was rewritten
+        collection = FakeCollection([dict(saved("Asia/Tokyo", "1"), _id=1)])
+        write_journal(tmp_path / "saved_timezones.journal", [{"op": "insert", "doc": saved("Asia/Tokyo", "1")}])
+        replica = make_replica(collection, tmp_path)
+        await replica.start()
+        await replica.stop()
+        assert [doc["id"] for doc in collection.docs] == ["1"]
+
+    asyncio.run(run())
+
+
+def test_torn_final_journal_line_is_skipped(tmp_path):
+    async def run():
+        journal = tmp_path / "saved_timezones.journal"
+        write_journal(journal, [{"op": "insert", "doc": saved("Asia/Tokyo", "1")}])
+        with open(journal, "a") as f:
+            f.write('{"op": "insert", "doc": {"id": "2", "timezone_')
+        replica = make_replica(FakeCollection(), tmp_path)
+        await replica.start()
+        assert [doc["timezone_id"] for doc in replica.list()] == ["Asia/Tokyo"]
+        await replica.stop()
+
+    asyncio.run(run())
+
+
+def test_reads_own_writes_while_flush_in_flight(tmp_path):
+    async def run():
+        collection = FakeCollection()
+        collection.flush_gate = asyncio.Event()
+        replica = make_replica(collection, tmp_path)
+        await replica.start()
+
+        assert await replica.insert(saved("Asia/Tokyo", "1"))
+        flush = asyncio.create_task(replica.flush())
+        await asyncio.sleep(0)
+
+        assert await replica.insert(saved("Europe/London", "2"))
+        assert not await replica.insert(saved("Asia/Tokyo", "3"))
+        assert await replica.delete("Asia/Tokyo")
+        assert [doc["timezone_id"] for doc in replica.list()] == ["Europe/London"]
+
+        collection.flush_gate.set()
+        await flush
+        assert [doc["timezone_id"] for doc in replica.list()] == ["Europe/London"]
+        await replica.stop()
+        assert [doc["timezone_id"] for doc in collection.docs] == ["Europe/London"]
+
+    asyncio.run(run())
+
+
+def test_falls_back_to_polling_without_change_streams(tmp_path):
+    async def run():
+        collection = FakeCollection()
+        replica = make_replica(collection, tmp_path, poll_interval=0.01)
+        await replica.start()
+        assert replica.list() == []
+
+        collection.docs.append(dict(saved("Asia/Tokyo", "1"), _id=1))
+        await asyncio.sleep(0.05)
+        assert [doc["timezone_id"] for doc in replica.list()] == ["Asia/Tokyo"]
+        await replica.stop()
+
+    asyncio.run(run())
+
+
+def test_second_process_cannot_share_journal(tmp_path):
+    async def run():
+        first = make_replica(FakeCollection(), tmp_path)
+        await first.start()
+        with pytest.raises(RuntimeError, match="single worker"):
+            await make_replica(FakeCollection(), tmp_path).start()
+        await first.stop()
+
+        second = make_replica(FakeCollection(), tmp_path)
+        await second.start()
+        await second.stop()
+
+    asyncio.run(run())
+
+
+def test_late_change_event_does_not_resurrect_deleted_timezone(tmp_path):
+    async def run():
+        collection = FakeReplicaSetCollection()
+        replica = make_replica(collection, tmp_path)
+        await replica.start()
+
+        await replica.insert(saved("Asia/Tokyo", "1"))
+        await replica.flush()
+        await replica.delete("Asia/Tokyo")
+        await replica.flush()
+        assert replica.list() == []
+
+        # The insert event from the first batch arrives after the delete was flushed
+        insert_event, delete_event = collection.events
+        collection.events = [insert_event]
+        await collection.deliver()
+        assert replica.list() == []
+        assert await replica.insert(saved("Asia/Tokyo", "2"))
+        assert await replica.delete("Asia/Tokyo")
+
+        await replica.flush()
+        collection.events.insert(0, delete_event)
+        await collection.deliver()
+        assert replica.list() == []
+        assert replica._unconfirmed == []
+        await replica.stop()
+
+    asyncio.run(run())
+
+
+def test_change_stream_applies_external_writes(tmp_path):
+    async def run():
+        collection = FakeReplicaSetCollection()
+        replica = make_replica(collection, tmp_path)
+        await replica.start()
+
+        collection.stream.put_nowait({"operationType": "insert", "fullDocument": dict(saved("Asia/Tokyo", "9"), _id=9)})
+        await asyncio.sleep(0.01)
+        assert [doc["timezone_id"] for doc in replica.list()] == ["Asia/Tokyo"]
+
+        collection.stream.put_nowait({"operationType": "delete", "documentKey": {"_id": 9}})
+        await asyncio.sleep(0.01)
+        assert replica.list() == []
+        await replica.stop()
+
+    asyncio.run(run())
+
+
+def test_unconfirmed_ops_expire(tmp_path):
+    async def run():
+        collection = FakeReplicaSetCollection()
+        replica = make_replica(collection, tmp_path, confirm_timeout=0)
+        await replica.start()
+        await replica.insert(saved("Asia/Tokyo", "1"))
+        await replica.flush()
+        await asyncio.sleep(0.01)
+        assert [doc["timezone_id"] for doc in replica.list()] == ["Asia/Tokyo"]
+        assert replica._unconfirmed == []
+        await replica.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,131 @@
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError
+
+import server
+from server import MongoPoolMetrics
+
+CACHED = [{"id": "1", "timezone_id": "Asia/Tokyo", "name": "Tokyo"}]
+FRESH = [{"id": "2", "timezone_id": "Europe/London", "name": "London"}]
+
+
+class FakeCursor:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def to_list(self, length):
+        self.collection.reads += 1
+        if self.collection.error:
+            raise self.collection.error
+        return list(self.collection.docs)
+
+
+class FakeCollection:
+    def __init__(self, docs, error=None):
+        self.docs = docs
+        self.error = error
+        self.reads = 0
+
+    def find(self):
+        return FakeCursor(self)
+
+
+class FakeDatabase:
+    def __init__(self, collection):
+        self.saved_timezones = collection
+
+
+class FakeAdmin:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def command(self, name):
+        if self.error:
+            raise self.error
+        return {"ok": 1}
+
+
+class FakeClient:
+    def __init__(self, error=None):
+        self.admin = FakeAdmin(error)
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = MongoPoolMetrics(100, executor_workers=2, max_in_flight=2)
+    monkeypatch.setattr(server, "mongo_pool_metrics", metrics)
+    monkeypatch.setattr(server, "saved_timezone_replica", None)
+    monkeypatch.setattr(server, "saved_timezones_cache", list(CACHED))
+    return metrics
+
+
+def get_saved(monkeypatch, mode, collection):
+    monkeypatch.setenv("MONGO_DEGRADED_MODE", mode)
+    monkeypatch.setattr(server, "db", FakeDatabase(collection))
+    return TestClient(server.app).get("/api/saved-timezones")
+
+
+def saturate(metrics):
+    metrics.in_flight = metrics.max_in_flight
+
+
+def test_healthy_read_refreshes_cache(monkeypatch, metrics):
+    response = get_saved(monkeypatch, "cache", FakeCollection(FRESH))
+    assert [tz["timezone_id"] for tz in response.json()] == ["Europe/London"]
+    assert server.saved_timezones_cache == FRESH
+    assert metrics.snapshot()["calls"] == 1
+
+
+def test_cache_mode_serves_cache_when_saturated(monkeypatch, metrics):
+    saturate(metrics)
+    collection = FakeCollection(FRESH)
+    response = get_saved(monkeypatch, "cache", collection)
+    assert [tz["timezone_id"] for tz in response.json()] == ["Asia/Tokyo"]
+    assert collection.reads == 0
+
+
+def test_cache_mode_serves_cache_on_mongo_error(monkeypatch, metrics):
+    response = get_saved(monkeypatch, "cache", FakeCollection(FRESH, error=PyMongoError("down")))
+    assert [tz["timezone_id"] for tz in response.json()] == ["Asia/Tokyo"]
+
+
+def test_cache_mode_without_cache_fails_fast(monkeypatch, metrics):
+    monkeypatch.setattr(server, "saved_timezones_cache", None)
+    saturate(metrics)
+    response = get_saved(monkeypatch, "cache", FakeCollection(FRESH))
+    assert response.status_code == 503
+
+
+def test_fail_mode_returns_503_when_saturated(monkeypatch, metrics):
+    saturate(metrics)
+    collection = FakeCollection(FRESH)
+    response = get_saved(monkeypatch, "fail", collection)
+    assert response.status_code == 503
+    assert collection.reads == 0
+
+
+def test_fail_mode_returns_503_on_mongo_error(monkeypatch, metrics):
+    response = get_saved(monkeypatch, "fail", FakeCollection(FRESH, error=PyMongoError("down")))
+    assert response.status_code == 503
+
+
+def test_off_mode_reads_mongo_even_when_saturated(monkeypatch, metrics):
+    saturate(metrics)
+    collection = FakeCollection(FRESH)
+    response = get_saved(monkeypatch, "off", collection)
+    assert [tz["timezone_id"] for tz in response.json()] == ["Europe/London"]
+    assert collection.reads == 1
+
+
+@pytest.mark.parametrize("saturated, error, status", [
+    (False, None, "ok"),
+    (True, None, "degraded"),
+    (False, ServerSelectionTimeoutError("no servers"), "unavailable"),
+])
+def test_db_health(monkeypatch, metrics, saturated, error, status):
+    if saturated:
+        saturate(metrics)
+    monkeypatch.setattr(server, "client", FakeClient(error))
+    body = TestClient(server.app).get("/api/health/db").json()
+    assert body["status"] == status
+    assert body["pool"]["max_in_flight"] == 2
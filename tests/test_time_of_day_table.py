@@ -0,0 +1,57 @@
+from datetime import date
+
+from fastapi.testclient import TestClient
+
+import server
+from server import build_time_of_day_table, etag_matches
+
+
+def make_client():
+    # No lifespan, so no Mongo client is created
+    return TestClient(server.app)
+
+
+def test_offsets_follow_dst_change_within_the_day():
+    table = build_time_of_day_table(date(2024, 3, 10))
+    new_york = table["zones"].index("America/New_York")
+    assert table["offsets"][new_york][:13] == [-300] * 13
+    assert table["offsets"][new_york][13:] == [-240] * 11
+    assert table["day_boundaries"][new_york]["local_midnight_ist"] == "10:30"
+
+
+def test_etag_and_not_modified():
+    client = make_client()
+    response = client.get("/api/time-of-day-table", params={"date": "2024-01-15"})
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "public, max-age=86400"
+    etag = response.headers["ETag"]
+
+    for if_none_match in (etag, "W/" + etag, '"other", ' + etag, "*"):
+        response = client.get("/api/time-of-day-table", params={"date": "2024-01-15"},
+                              headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+    response = client.get("/api/time-of-day-table", params={"date": "2024-01-15"},
+                          headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
+def test_dateless_request_is_cached_until_ist_midnight():
+    response = make_client().get("/api/time-of-day-table")
+    assert response.status_code == 200
+    max_age = int(response.headers["Cache-Control"].split("max-age=")[1])
+    assert 0 < max_age <= 86400
+
+
+def test_out_of_range_dates_are_rejected():
+    client = make_client()
+    for value in ("0001-01-01", "9999-12-31", "2024-13-01"):
+        response = client.get("/api/time-of-day-table", params={"date": value})
+        assert response.status_code == 400
+
+
+def test_etag_matches_is_weak():
+    assert etag_matches('W/"abc"', '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches("", '"abc"')